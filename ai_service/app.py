@@ -1,7 +1,8 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from model.response_engine import generate_answer
+from model.response_engine import generate_answers, warm_up
+import asyncio
 import logging
 import os
 
@@ -23,6 +24,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Micro-batching: coalesce concurrent /ask requests so the embedding model
+# and FAISS see one batched call instead of N single-query calls
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT_MS = 5
+
+_ask_queue: asyncio.Queue = None
+_batcher_task: asyncio.Task = None
+_warmup_task: asyncio.Task = None
+
+async def _drain_ask_queue():
+    """Background task: collect in-flight questions and answer them as one batch"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _ask_queue.get()]
+        deadline = loop.time() + BATCH_MAX_WAIT_MS / 1000.0
+
+        while len(batch) < BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_ask_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        questions = [question for question, _ in batch]
+        try:
+            answers = await asyncio.to_thread(generate_answers, questions)
+            for (_, future), answer in zip(batch, answers):
+                if not future.done():
+                    future.set_result(answer)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+@app.on_event("startup")
+async def start_batcher():
+    global _ask_queue, _batcher_task, _warmup_task
+    _ask_queue = asyncio.Queue()
+    _batcher_task = asyncio.create_task(_drain_ask_queue())
+    # CPU-bound pipeline work (encode, FAISS, Gemini I/O) always runs via
+    # asyncio.to_thread in the batcher, keeping the event loop free; warm
+    # the engine off-loop too so the first /ask skips model/index loading.
+    # The module global keeps a strong reference -- the loop holds tasks
+    # only weakly, so an anonymous task could be collected mid-flight
+    _warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    logger.info("Request batcher started")
+
 class Query(BaseModel):
     question: str
 
@@ -48,9 +98,11 @@ async def ask(query: Query):
             raise HTTPException(status_code=400, detail="Question cannot be empty")
         
         logger.info(f"Received question: {query.question[:100]}...")
-        
-        # Generate answer using the AI pipeline
-        answer = generate_answer(query.question)
+
+        # Hand the question to the batcher and wait for its slot in the batch
+        future = asyncio.get_running_loop().create_future()
+        await _ask_queue.put((query.question, future))
+        answer = await future
         
         if not answer:
             raise HTTPException(status_code=500, detail="Failed to generate answer")
@@ -1,6 +1,9 @@
+import hashlib
 import os
 import pickle
 import logging
+import shelve
+import threading
 from typing import List, Tuple
 import numpy as np
 from sentence_transformers import SentenceTransformer
@@ -8,6 +11,33 @@ import faiss
 
 logger = logging.getLogger(__name__)
 
+# Let FAISS use every core for batched scans
+faiss.omp_set_num_threads(os.cpu_count())
+
+# One loaded encoder per model name, shared by every EmbeddingManager; the
+# lock serializes first loads so the one-time ONNX export runs exactly once
+_MODEL_CACHE = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+class LazyTexts:
+    """
+    Read-only, list-like view over text chunks stored in a flat binary file
+
+    Chunks are decoded on access from a memory-mapped file, so startup does
+    not unpickle or materialize the whole corpus in RAM.
+    """
+
+    def __init__(self, texts_path: str, offsets_path: str):
+        self._data = np.memmap(texts_path, dtype=np.uint8, mode='r')
+        self._offsets = np.load(offsets_path)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return bytes(self._data[start:end]).decode('utf-8')
+
 class EmbeddingManager:
     """
     Manages creation and storage of text embeddings using SentenceTransformers and FAISS
@@ -16,97 +46,291 @@ class EmbeddingManager:
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         """
         Initialize the embedding model
-        
+
         Args:
             model_name: Name of the SentenceTransformer model
         """
         self.model_name = model_name
-        logger.info(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        self.dimension = self.model.get_sentence_embedding_dimension()
-        logger.info(f"Embedding dimension: {self.dimension}")
+        self.quantization = os.getenv("QUANTIZATION", "").lower()
+        self.corpus_embeddings = None
+
+    @property
+    def model(self) -> SentenceTransformer:
+        """
+        The sentence encoder, loaded on first use and shared per model name
+
+        Loading an index for serving does not need the encoder, so deferring
+        it keeps cold starts fast; ingest scripts and the retriever creating
+        separate EmbeddingManager instances share one loaded model.
+        """
+        if self.model_name not in _MODEL_CACHE:
+            with _MODEL_CACHE_LOCK:
+                if self.model_name not in _MODEL_CACHE:
+                    logger.info(f"Loading embedding model: {self.model_name}")
+                    _MODEL_CACHE[self.model_name] = self._load_model(self.model_name)
+        return _MODEL_CACHE[self.model_name]
+
+    @property
+    def dimension(self) -> int:
+        """Embedding dimension (loads the encoder on first access)"""
+        return self.model.get_sentence_embedding_dimension()
+
+    def _load_model(self, model_name: str) -> SentenceTransformer:
+        """
+        Load the SentenceTransformer with an int8-quantized ONNX backend when available
+
+        Dynamic int8 quantization is a one-time export cached under data/onnx_quantized;
+        subsequent startups reuse the exported model. Falls back to the standard
+        PyTorch FP32 model if the ONNX backend or its dependencies are missing.
+        """
+        try:
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            quantized_dir = os.path.join("data", "onnx_quantized", model_name.replace("/", "_"))
+            quantized_file = os.path.join(quantized_dir, "onnx", "model_qint8_avx512_vnni.onnx")
+
+            if not os.path.exists(quantized_file):
+                logger.info("Exporting int8-quantized ONNX model (one-time)")
+                base_model = SentenceTransformer(model_name, backend="onnx")
+                base_model.save(quantized_dir)
+                export_dynamic_quantized_onnx_model(base_model, "avx512_vnni", quantized_dir)
+
+            model = SentenceTransformer(
+                quantized_dir,
+                backend="onnx",
+                model_kwargs={"file_name": "onnx/model_qint8_avx512_vnni.onnx"}
+            )
+            logger.info("Loaded int8-quantized ONNX embedding model")
+            return model
+        except Exception as e:
+            logger.warning(f"ONNX int8 backend unavailable ({e}). Falling back to PyTorch model.")
+            model = SentenceTransformer(model_name)
+            # Halve weight bandwidth on CUDA; MiniLM loses negligible accuracy
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    model = model.half()
+                    logger.info("Embedding model weights converted to FP16")
+            except ImportError:
+                pass
+            return model
         
-    def create_embeddings(self, texts: List[str]) -> np.ndarray:
+    def create_embeddings(self, texts: List[str],
+                          cache_path: str = "data/embedding_cache") -> np.ndarray:
         """
         Create embeddings for a list of text chunks
-        
+
+        Chunk embeddings are cached on disk keyed by model name and chunk
+        hash, so rebuilds (e.g. after adding one textbook) skip tokenization
+        and the transformer forward pass for chunks embedded before.
+
         Args:
             texts: List of text strings
-            
+            cache_path: Location of the on-disk per-chunk embedding cache
+
         Returns:
             Numpy array of embeddings
         """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
         logger.info(f"Creating embeddings for {len(texts)} text chunks")
-        embeddings = self.model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-        return embeddings
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with shelve.open(cache_path) as cache:
+            keys = [
+                f"{self.model_name}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+                for text in texts
+            ]
+            rows = [cache.get(key) for key in keys]
+            misses = [i for i, row in enumerate(rows) if row is None]
+
+            if misses:
+                # normalize_embeddings=True normalizes on-device inside
+                # encode, saving a separate normalize_L2 pass over the array
+                encoded = self.model.encode(
+                    [texts[i] for i in misses], show_progress_bar=True,
+                    convert_to_numpy=True, normalize_embeddings=True
+                )
+                encoded = np.ascontiguousarray(encoded, dtype=np.float32)
+                for i, row in zip(misses, encoded):
+                    rows[i] = row
+                    cache[keys[i]] = row
+
+            logger.info(
+                f"Embedded {len(misses)} chunks, "
+                f"{len(texts) - len(misses)} served from cache"
+            )
+
+        # FAISS requires contiguous FP32 input; enforcing it here once avoids
+        # hidden per-call copies inside add/search (and upcasts FP16 output)
+        return np.ascontiguousarray(np.vstack(rows), dtype=np.float32)
     
     def build_faiss_index(self, embeddings: np.ndarray) -> faiss.Index:
         """
         Build FAISS index for fast similarity search
-        
+
+        Small corpora get an HNSW graph index (sublinear search, exact vectors);
+        large corpora (>10k chunks) get an IVF-PQ index, which is both sublinear
+        and compressed. Both avoid the linear full-scan cost of a flat index.
+
         Args:
             embeddings: Numpy array of embeddings
-            
+
         Returns:
             FAISS index
         """
         logger.info("Building FAISS index")
-        
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
-        
-        # Create index
-        index = faiss.IndexFlatIP(self.dimension)  # Inner Product (cosine similarity)
-        index.add(embeddings)
-        
-        logger.info(f"FAISS index built with {index.ntotal} vectors")
+
+        # Embeddings arrive L2-normalized from create_embeddings, so inner
+        # product equals cosine similarity without another pass here
+        num_vectors = embeddings.shape[0]
+
+        if self.quantization == "binary":
+            # 1 bit per dimension: pack sign bits and search by Hamming
+            # distance (popcount). 32x smaller than FP32; candidates are
+            # reranked in FP32 by the retriever.
+            binary = np.packbits((embeddings > 0).astype(np.uint8), axis=1)
+            index = faiss.IndexBinaryFlat(self.dimension)
+            index.add(binary)
+        elif self.quantization == "int8":
+            # Scalar int8 quantization: 4x smaller index, 4x less bandwidth per
+            # scan. Queries stay FP32; search reranks candidates against the
+            # FP32 corpus matrix kept alongside the index.
+            index = faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_8bit,
+                faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(embeddings)
+            index.add(embeddings)
+        elif num_vectors > 10_000:
+            # IVF-PQ: coarse quantizer + product-quantized residuals
+            nlist = int(4 * np.sqrt(num_vectors))
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            index = faiss.IndexIVFPQ(
+                quantizer, self.dimension, nlist, 32, 8,
+                faiss.METRIC_INNER_PRODUCT
+            )
+            logger.info(f"Training IVF-PQ index (nlist={nlist})")
+            index.train(embeddings)
+            index.add(embeddings)
+            index.nprobe = 8
+        else:
+            # HNSW graph over exact vectors
+            index = faiss.IndexHNSWFlat(self.dimension, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = 64
+            index.add(embeddings)
+
+        logger.info(f"FAISS index built with {index.ntotal} vectors ({type(index).__name__})")
         return index
     
-    def save_index(self, index: faiss.Index, texts: List[str], 
+    def _to_gpu(self, index: faiss.Index) -> faiss.Index:
+        """
+        Move an index to GPU 0 when a CUDA-enabled FAISS build sees a device
+
+        Queries arrive batched (see app.py's request batcher), which is where
+        GPU search pays off; single-vector GPU search can be slower than CPU.
+        Returns the index unchanged on CPU-only builds or machines.
+        """
+        try:
+            if hasattr(faiss, 'get_num_gpus') and faiss.get_num_gpus() > 0:
+                res = faiss.StandardGpuResources()
+                index = faiss.index_cpu_to_gpu(res, 0, index)
+                logger.info("FAISS index moved to GPU 0")
+        except Exception as e:
+            logger.warning(f"Could not move FAISS index to GPU: {e}. Staying on CPU.")
+        return index
+
+    def save_index(self, index: faiss.Index, texts: List[str],
                    index_path: str = "data/vector_store/faiss_index.faiss",
-                   metadata_path: str = "data/vector_store/metadata.pkl"):
+                   metadata_path: str = "data/vector_store/metadata.pkl",
+                   embeddings_path: str = "data/vector_store/embeddings.npy",
+                   texts_path: str = "data/vector_store/texts.bin",
+                   offsets_path: str = "data/vector_store/offsets.npy"):
         """
-        Save FAISS index and associated metadata
+        Save FAISS index, associated metadata and the FP32 corpus embeddings
+        (the latter are needed for reranking when the index is quantized)
+
+        Texts go into a flat binary file plus an int64 offset table so they
+        can be memory-mapped at load time instead of unpickled into RAM.
         """
         os.makedirs(os.path.dirname(index_path), exist_ok=True)
-        
-        # Save FAISS index
-        faiss.write_index(index, index_path)
+
+        # Save FAISS index (binary indexes use a separate serializer)
+        if isinstance(index, faiss.IndexBinary):
+            faiss.write_index_binary(index, index_path)
+        else:
+            faiss.write_index(index, index_path)
         logger.info(f"FAISS index saved to {index_path}")
+
+        # Save FP32 embeddings for quantized-index reranking
+        if self.corpus_embeddings is not None:
+            np.save(embeddings_path, self.corpus_embeddings)
+            logger.info(f"Corpus embeddings saved to {embeddings_path}")
         
-        # Save metadata (original texts)
+        # Save texts as one flat UTF-8 blob plus offsets for mmap loading
+        encoded = [text.encode('utf-8') for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+
+        with open(texts_path, 'wb') as f:
+            f.write(b''.join(encoded))
+        np.save(offsets_path, offsets)
+        logger.info(f"Corpus texts saved to {texts_path} ({len(encoded)} chunks)")
+
+        # Save metadata
         metadata = {
-            'texts': texts,
+            'num_texts': len(texts),
             'model_name': self.model_name,
             'dimension': self.dimension
         }
-        
+
         with open(metadata_path, 'wb') as f:
             pickle.dump(metadata, f)
         logger.info(f"Metadata saved to {metadata_path}")
     
     def load_index(self, index_path: str = "data/vector_store/faiss_index.faiss",
-                   metadata_path: str = "data/vector_store/metadata.pkl") -> Tuple[faiss.Index, List[str]]:
+                   metadata_path: str = "data/vector_store/metadata.pkl",
+                   embeddings_path: str = "data/vector_store/embeddings.npy",
+                   texts_path: str = "data/vector_store/texts.bin",
+                   offsets_path: str = "data/vector_store/offsets.npy") -> Tuple[faiss.Index, List[str]]:
         """
         Load FAISS index and metadata
-        
+
         Returns:
-            Tuple of (FAISS index, list of texts)
+            Tuple of (FAISS index, list-like of texts); texts are a
+            memory-mapped LazyTexts view when the flat-file format exists,
+            otherwise the legacy pickled list
         """
         if not os.path.exists(index_path) or not os.path.exists(metadata_path):
             raise FileNotFoundError("FAISS index or metadata not found. Please run rebuild_embeddings.py first.")
         
         # Load FAISS index
-        index = faiss.read_index(index_path)
+        if self.quantization == "binary":
+            index = faiss.read_index_binary(index_path)
+        else:
+            index = faiss.read_index(index_path)
+            index = self._to_gpu(index)
         logger.info(f"FAISS index loaded from {index_path} ({index.ntotal} vectors)")
         
         # Load metadata
         with open(metadata_path, 'rb') as f:
             metadata = pickle.load(f)
-        
-        texts = metadata['texts']
-        logger.info(f"Metadata loaded: {len(texts)} text chunks")
-        
+
+        # Prefer the memory-mapped flat-file corpus; fall back to stores
+        # written before texts.bin existed, which pickled the full list
+        if os.path.exists(texts_path) and os.path.exists(offsets_path):
+            texts = LazyTexts(texts_path, offsets_path)
+            logger.info(f"Memory-mapped {len(texts)} text chunks from {texts_path}")
+        else:
+            texts = metadata['texts']
+            logger.info(f"Metadata loaded: {len(texts)} text chunks")
+
+        # FP32 corpus embeddings, used to rerank quantized-index candidates
+        if os.path.exists(embeddings_path):
+            self.corpus_embeddings = np.load(embeddings_path)
+            logger.info(f"Corpus embeddings loaded from {embeddings_path}")
+
         return index, texts
     
     def build_from_processed_texts(self, processed_dir: str = "data/processed_texts") -> Tuple[faiss.Index, List[str]]:
@@ -139,10 +363,13 @@ class EmbeddingManager:
         
         # Create embeddings
         embeddings = self.create_embeddings(all_chunks)
-        
+
         # Build FAISS index
         index = self.build_faiss_index(embeddings)
-        
+
+        # Keep the FP32 matrix so save_index can persist it for reranking
+        self.corpus_embeddings = embeddings
+
         return index, all_chunks
 
 if __name__ == "__main__":
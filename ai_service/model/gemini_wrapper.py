@@ -4,6 +4,29 @@ from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Static prompt segments, built once; generate_answer only concatenates
+_PROMPT_PREFIX = """You are an educational assistant helping students with NCERT curriculum (Classes 6-10).
+
+**Context from NCERT textbooks:**
+"""
+
+_PROMPT_MIDDLE = """
+
+**Student's Question:**
+"""
+
+_PROMPT_SUFFIX = """
+
+**Instructions:**
+1. Answer the question based ONLY on the provided context
+2. If the context doesn't contain enough information, say so clearly
+3. Use simple, student-friendly language
+4. Structure your answer with clear explanations
+5. Add examples if relevant from the context
+6. Keep the answer educational and encouraging
+
+**Answer:**"""
+
 class GeminiWrapper:
     """
     Optional wrapper for Google Gemini API to enhance answer quality
@@ -36,27 +59,13 @@ class GeminiWrapper:
         Returns:
             Generated answer
         """
-        prompt = f"""You are an educational assistant helping students with NCERT curriculum (Classes 6-10).
-
-**Context from NCERT textbooks:**
-{context}
-
-**Student's Question:**
-{query}
+        prompt = _PROMPT_PREFIX + context + _PROMPT_MIDDLE + query + _PROMPT_SUFFIX
 
-**Instructions:**
-1. Answer the question based ONLY on the provided context
-2. If the context doesn't contain enough information, say so clearly
-3. Use simple, student-friendly language
-4. Structure your answer with clear explanations
-5. Add examples if relevant from the context
-6. Keep the answer educational and encouraging
-
-**Answer:**"""
-        
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            # Streaming overlaps network transfer with model generation
+            # instead of waiting for the complete response
+            response = self.model.generate_content(prompt, stream=True)
+            return ''.join(chunk.text for chunk in response)
         except Exception as e:
             logger.error(f"Gemini API error: {str(e)}")
             raise
@@ -1,12 +1,31 @@
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
+import numpy as np
 import PyPDF2
 import logging
 from pathlib import Path
 
+# Prefer PDFium's native extractor; fall back to pure-Python PyPDF2
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
 logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r'\S+')
+
+# Cleaning is fused into single passes: one translate for quote normalization,
+# one regex for page numbers/headers + stray characters, one for whitespace
+_TRANS = str.maketrans({
+    '“': '"', '”': '"',  # curly double quotes
+    '‘': "'", '’': "'",  # curly single quotes
+})
+_BAD_RE = re.compile(r'\b\d{1,3}\b\s*(?:NCERT|Science|Mathematics|English)?|[^\w\s.,!?;:()\-\'\"]+')
+_WS_RE = re.compile(r'\s+')
+
 class PDFPreprocessor:
     """
     Handles extraction and cleaning of text from NCERT PDFs
@@ -18,53 +37,78 @@ class PDFPreprocessor:
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract raw text from a PDF file"""
         try:
-            text = ""
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                num_pages = len(pdf_reader.pages)
-                
-                logger.info(f"Extracting text from {os.path.basename(pdf_path)} ({num_pages} pages)")
-                
-                for page_num in range(num_pages):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
-            
-            return text
+            if pypdfium2 is not None:
+                return self._extract_with_pdfium(pdf_path)
+            return self._extract_with_pypdf2(pdf_path)
         except Exception as e:
             logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
             return ""
+
+    def _extract_with_pdfium(self, pdf_path: str) -> str:
+        """Extract text using PDFium's native extractor"""
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            logger.info(f"Extracting text from {os.path.basename(pdf_path)} ({len(pdf)} pages)")
+
+            page_texts = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                page_texts.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+
+            return "\n".join(page_texts) + "\n"
+        finally:
+            pdf.close()
+
+    def _extract_with_pypdf2(self, pdf_path: str) -> str:
+        """Extract text using PyPDF2 (pure Python, slower)"""
+        text = ""
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            num_pages = len(pdf_reader.pages)
+
+            logger.info(f"Extracting text from {os.path.basename(pdf_path)} ({num_pages} pages)")
+
+            for page_num in range(num_pages):
+                page = pdf_reader.pages[page_num]
+                text += page.extract_text() + "\n"
+
+        return text
     
     def clean_text(self, text: str) -> str:
         """Clean and normalize extracted text"""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove page numbers and headers/footers
-        text = re.sub(r'\b\d{1,3}\b\s*(?:NCERT|Science|Mathematics|English)?', '', text)
-        
-        # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s.,!?;:()\-\'\"]+', '', text)
-        
         # Normalize quotes
-        text = text.replace('"', '"').replace('"', '"').replace(''', "'").replace(''', "'")
-        
-        # Remove multiple spaces
-        text = ' '.join(text.split())
-        
-        return text.strip()
+        text = text.translate(_TRANS)
+
+        # Remove page numbers/headers and special characters in one pass
+        text = _BAD_RE.sub('', text)
+
+        # Collapse whitespace runs
+        return _WS_RE.sub(' ', text).strip()
     
     def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 100) -> List[str]:
         """
         Split text into overlapping chunks for better context preservation
+
+        Word offsets are computed once so each chunk is a single slice of the
+        original string, avoiding a per-window split/join over the whole text.
         """
-        words = text.split()
+        spans = [m.span() for m in _WORD_RE.finditer(text)]
+        num_words = len(spans)
+
+        if num_words == 0:
+            return []
+
+        starts = np.fromiter((start for start, _ in spans), dtype=np.int64, count=num_words)
+        ends = np.fromiter((end for _, end in spans), dtype=np.int64, count=num_words)
+
         chunks = []
-        
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
+        for i in range(0, num_words, chunk_size - overlap):
+            chunk = text[starts[i]:ends[min(i + chunk_size, num_words) - 1]]
             if len(chunk.strip()) > 50:  # Minimum chunk size
                 chunks.append(chunk)
-        
+
         return chunks
     
     def process_all_pdfs(self, output_dir: str = "data/processed_texts") -> dict:
@@ -86,32 +130,36 @@ class PDFPreprocessor:
             return {}
         
         logger.info(f"Found {len(pdf_files)} PDF files to process")
-        
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(self.pdf_dir, pdf_file)
-            
-            # Extract text
-            raw_text = self.extract_text_from_pdf(pdf_path)
-            
-            if not raw_text:
-                continue
-            
-            # Clean text
-            clean = self.clean_text(raw_text)
-            
-            # Chunk text
-            chunks = self.chunk_text(clean)
-            
-            # Save processed text
-            output_file = os.path.join(output_dir, f"{os.path.splitext(pdf_file)[0]}.txt")
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write('\n\n---CHUNK---\n\n'.join(chunks))
-            
-            processed_data[pdf_file] = chunks
-            logger.info(f"Processed {pdf_file}: {len(chunks)} chunks created")
-        
+
+        pdf_paths = [os.path.join(self.pdf_dir, f) for f in pdf_files]
+
+        # Extraction is CPU-bound and independent per PDF, so fan out to
+        # worker processes; output files are written in the main process
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for pdf_file, chunks in zip(pdf_files, executor.map(_process_one_pdf, pdf_paths)):
+                if not chunks:
+                    continue
+
+                # Save processed text
+                output_file = os.path.join(output_dir, f"{os.path.splitext(pdf_file)[0]}.txt")
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write('\n\n---CHUNK---\n\n'.join(chunks))
+
+                processed_data[pdf_file] = chunks
+                logger.info(f"Processed {pdf_file}: {len(chunks)} chunks created")
+
         return processed_data
 
+def _process_one_pdf(pdf_path: str) -> List[str]:
+    """Extract, clean and chunk a single PDF (runs in a worker process)"""
+    preprocessor = PDFPreprocessor(os.path.dirname(pdf_path))
+
+    raw_text = preprocessor.extract_text_from_pdf(pdf_path)
+    if not raw_text:
+        return []
+
+    return preprocessor.chunk_text(preprocessor.clean_text(raw_text))
+
 def preprocess_ncert_data(raw_dir='data/raw_pdfs', output_dir='data/processed_texts'):
     """Main preprocessing function"""
     preprocessor = PDFPreprocessor(raw_dir)
@@ -1,18 +1,32 @@
+import io
 import logging
 import os
-from typing import Optional
+import re
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import List, Optional
 from model.retriever import SemanticRetriever
 from model.gemini_wrapper import GeminiWrapper
 
 logger = logging.getLogger(__name__)
 
+# Many students ask identical NCERT questions, so cache final answers too
+ANSWER_CACHE_SIZE = 2048
+
+# Sentence spans ending in . ! or ? -- unlike split('.'), this keeps the
+# terminator and doesn't break on every decimal point
+_SENT_RE = re.compile(r'[^.!?]+[.!?]')
+
 class ResponseEngine:
     """
     Generates educational responses using retrieved context
     """
-    
+
     def __init__(self, use_gemini: bool = False):
         self.retriever = SemanticRetriever()
+        # LRU of (normalized question, top_k) -> final answer string
+        self._answer_cache = OrderedDict()
         self.use_gemini = use_gemini and os.getenv('GEMINI_API_KEY')
         
         if self.use_gemini:
@@ -37,26 +51,29 @@ class ResponseEngine:
                 "in NCERT textbooks for classes 6-10 (Science, Maths, or English)."
             )
         
-        # Extract key sentences from context
-        sentences = context.split('.')
-        key_points = [s.strip() + '.' for s in sentences[:5] if len(s.strip()) > 20]
-        
-        answer_parts = [
-            f"Based on the NCERT curriculum, here's what I found about your question:\n",
-            f"**Question:** {query}\n",
-            f"**Answer:**\n"
-        ]
-        
+        # Extract key sentences from context; finditer is lazy, so only the
+        # leading part of long contexts is ever scanned
+        key_points = list(islice(
+            (m.group(0).strip() for m in _SENT_RE.finditer(context)
+             if len(m.group(0)) > 21),
+            5
+        ))
+
+        answer = io.StringIO()
+        answer.write("Based on the NCERT curriculum, here's what I found about your question:\n\n")
+        answer.write(f"**Question:** {query}\n\n")
+        answer.write("**Answer:**\n\n")
+
         # Add context in a structured way
         for i, point in enumerate(key_points, 1):
-            answer_parts.append(f"{i}. {point}\n")
-        
-        answer_parts.append(
+            answer.write(f"{i}. {point}\n\n")
+
+        answer.write(
             "\n**Note:** This answer is derived directly from NCERT textbooks. "
             "If you need more details, please ask a more specific question."
         )
-        
-        return '\n'.join(answer_parts)
+
+        return answer.getvalue()
     
     def generate(self, query: str, top_k: int = 3) -> str:
         """
@@ -69,35 +86,102 @@ class ResponseEngine:
         Returns:
             Formatted answer string
         """
-        # Retrieve relevant context
-        context = self.retriever.get_context(query, top_k)
-        
-        # Generate answer
-        if self.use_gemini and self.gemini:
-            try:
-                answer = self.gemini.generate_answer(query, context)
-            except Exception as e:
-                logger.error(f"Gemini generation failed: {e}. Using template.")
+        return self.generate_batch([query], top_k)[0]
+
+    def generate_batch(self, queries: List[str], top_k: int = 3) -> List[str]:
+        """
+        Generate answers for several questions with a single batched retrieval
+
+        Args:
+            queries: List of user questions
+            top_k: Number of context chunks to retrieve per question
+
+        Returns:
+            List of formatted answer strings, one per question
+        """
+        # Answers are deterministic given (question, top_k): serve repeats
+        # from the cache without retrieval or generation
+        keys = [(query.strip().lower(), top_k) for query in queries]
+        answers = [self._cache_lookup(key) for key in keys]
+        misses = [i for i, answer in enumerate(answers) if answer is None]
+
+        if not misses:
+            return answers
+
+        # Retrieve context for all uncached queries in one encode + FAISS call
+        miss_queries = [queries[i] for i in misses]
+        contexts = self.retriever.get_context_batch(miss_queries, top_k)
+
+        for i, query, context in zip(misses, miss_queries, contexts):
+            cacheable = True
+            if self.use_gemini and self.gemini:
+                try:
+                    answer = self.gemini.generate_answer(query, context)
+                except Exception as e:
+                    logger.error(f"Gemini generation failed: {e}. Using template.")
+                    answer = self.format_template_answer(query, context)
+                    # Don't pin a transient Gemini error as the cached answer
+                    cacheable = False
+            else:
                 answer = self.format_template_answer(query, context)
-        else:
-            answer = self.format_template_answer(query, context)
-        
+
+            answers[i] = answer
+            if cacheable:
+                self._cache_store(keys[i], answer)
+
+        return answers
+
+    def _cache_lookup(self, key) -> Optional[str]:
+        answer = self._answer_cache.get(key)
+        if answer is not None:
+            self._answer_cache.move_to_end(key)
         return answer
 
-# Singleton instance
+    def _cache_store(self, key, answer: str):
+        self._answer_cache[key] = answer
+        self._answer_cache.move_to_end(key)
+        if len(self._answer_cache) > ANSWER_CACHE_SIZE:
+            self._answer_cache.popitem(last=False)
+
+# Singleton instance; the lock keeps the startup warm-up thread and the
+# batcher's worker threads from constructing two engines concurrently
 _response_engine = None
+_engine_lock = threading.Lock()
+
+def _get_engine() -> ResponseEngine:
+    global _response_engine
+
+    if _response_engine is None:
+        with _engine_lock:
+            if _response_engine is None:
+                use_gemini = bool(os.getenv('GEMINI_API_KEY'))
+                _response_engine = ResponseEngine(use_gemini=use_gemini)
+
+    return _response_engine
 
 def generate_answer(question: str) -> str:
     """
     Main function called by the API to generate answers
     """
-    global _response_engine
-    
-    if _response_engine is None:
-        use_gemini = bool(os.getenv('GEMINI_API_KEY'))
-        _response_engine = ResponseEngine(use_gemini=use_gemini)
-    
-    return _response_engine.generate(question)
+    return _get_engine().generate(question)
+
+def generate_answers(questions: List[str]) -> List[str]:
+    """
+    Batched variant of generate_answer for coalesced API requests
+    """
+    return _get_engine().generate_batch(questions)
+
+def warm_up():
+    """
+    Build the response engine and load the encoder ahead of the first request
+
+    Called from a worker thread at API startup so the first /ask does not pay
+    for index and model loading.
+    """
+    engine = _get_engine()
+    # Touching .model triggers the lazily loaded sentence encoder
+    engine.retriever.embedding_manager.model
+    logger.info("Response engine warmed up")
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
@@ -1,27 +1,48 @@
+import hashlib
 import logging
+from collections import OrderedDict
 from typing import List, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import faiss
 from model.embeddings import EmbeddingManager
 
 logger = logging.getLogger(__name__)
 
+# Students frequently repeat the same NCERT questions, so cache aggressively
+EMBEDDING_CACHE_SIZE = 4096
+RESULT_CACHE_SIZE = 4096
+
 class SemanticRetriever:
     """
     Performs semantic search over NCERT content using FAISS
     """
-    
+
     def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
         self.embedding_manager = EmbeddingManager(model_name)
         self.index = None
         self.texts = None
+        # LRU caches: query hash -> normalized embedding / (hash, top_k) -> results
+        self._embedding_cache = OrderedDict()
+        self._result_cache = OrderedDict()
         self._load_index()
     
     def _load_index(self):
         """Load the pre-built FAISS index and metadata"""
         try:
             self.index, self.texts = self.embedding_manager.load_index()
+
+            # A binary index only yields Hamming distances; without the FP32
+            # corpus matrix to rerank into similarities its raw scores would
+            # be returned with inverted semantics, so refuse to serve
+            if (self.embedding_manager.quantization == "binary"
+                    and self.embedding_manager.corpus_embeddings is None):
+                logger.error(
+                    "QUANTIZATION=binary requires the FP32 corpus embeddings "
+                    "(embeddings.npy) for reranking. Please rebuild the vector store."
+                )
+                self.index = None
+                self.texts = []
+                return
+
             logger.info("FAISS index loaded successfully")
         except FileNotFoundError as e:
             logger.error(str(e))
@@ -31,35 +52,169 @@ class SemanticRetriever:
     def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
         """
         Search for the most relevant text chunks for a given query
-        
+
         Args:
             query: User's question
             top_k: Number of top results to return
-            
+
         Returns:
             List of tuples (text_chunk, similarity_score)
         """
+        return self.search_batch([query], top_k)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 5) -> List[List[Tuple[str, float]]]:
+        """
+        Search for relevant chunks for several queries in a single FAISS call
+
+        Encoding and searching a stacked query matrix amortizes transformer
+        overhead and lets FAISS use batched BLAS instead of per-vector scans.
+
+        Args:
+            queries: List of user questions
+            top_k: Number of top results to return per query
+
+        Returns:
+            List (one per query) of lists of tuples (text_chunk, similarity_score)
+        """
+        return [
+            [(self.texts[idx], score) for idx, score in zip(row_indices, row_scores.tolist())]
+            for row_indices, row_scores in self._search_arrays_batch(queries, top_k)
+        ]
+
+    def _search_arrays_batch(self, queries: List[str],
+                             top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Batched search returning per-query (indices, scores) arrays
+
+        Keeping results as arrays (also in the result cache) defers text
+        lookup and Python tuple building to the callers that need them.
+        """
         if self.index is None or not self.texts:
             logger.error("Index not loaded. Cannot perform search.")
-            return []
-        
-        # Create query embedding
-        query_embedding = self.embedding_manager.model.encode([query], convert_to_numpy=True)
-        
-        # Normalize for cosine similarity
-        faiss.normalize_L2(query_embedding)
-        
-        # Search
-        scores, indices = self.index.search(query_embedding, top_k)
-        
-        # Prepare results
-        results = []
-        for idx, score in zip(indices[0], scores[0]):
-            if idx < len(self.texts):
-                results.append((self.texts[idx], float(score)))
-        
-        logger.info(f"Retrieved {len(results)} relevant chunks for query")
-        return results
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+                    for _ in queries]
+
+        # Serve repeated questions straight from the result cache
+        keys = [self._cache_key(query) for query in queries]
+        all_results = [self._cache_get(self._result_cache, (key, top_k)) for key in keys]
+        misses = [i for i, results in enumerate(all_results) if results is None]
+
+        if misses:
+            miss_results = self._search_uncached([queries[i] for i in misses], top_k)
+            for i, results in zip(misses, miss_results):
+                all_results[i] = results
+                self._cache_put(self._result_cache, (keys[i], top_k), results, RESULT_CACHE_SIZE)
+
+        logger.info(
+            f"Retrieved results for {len(queries)} queries "
+            f"({len(queries) - len(misses)} cache hits)"
+        )
+        return all_results
+
+    def _search_uncached(self, queries: List[str],
+                         top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Encode queries (with embedding cache) and run one batched FAISS search"""
+        query_embeddings = self._encode_queries(queries)
+
+        # Quantized indexes lose precision, so oversample candidates and
+        # rerank them against the FP32 corpus matrix
+        corpus = self.embedding_manager.corpus_embeddings
+        quantization = self.embedding_manager.quantization
+        rerank = quantization in ("int8", "binary") and corpus is not None
+        search_k = min(top_k * 4, len(self.texts)) if rerank else top_k
+
+        # Single batched search over the stacked matrix
+        if quantization == "binary":
+            # Binary index: pack query sign bits and search by Hamming distance
+            binary_queries = np.packbits((query_embeddings > 0).astype(np.uint8), axis=1)
+            scores, indices = self.index.search(binary_queries, search_k)
+        else:
+            scores, indices = self.index.search(query_embeddings, search_k)
+
+        if rerank:
+            scores, indices = self._rerank_fp32(query_embeddings, indices, top_k)
+
+        # Mask out-of-range ids vectorized instead of testing per element
+        # (FAISS pads short result rows with -1)
+        num_texts = len(self.texts)
+        all_results = []
+        for row_indices, row_scores in zip(indices, scores):
+            row_indices = np.asarray(row_indices)
+            row_scores = np.asarray(row_scores, dtype=np.float32)
+            valid = (row_indices >= 0) & (row_indices < num_texts)
+            all_results.append((row_indices[valid], row_scores[valid]))
+
+        return all_results
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Encode queries to normalized FP32 embeddings, skipping the transformer
+        forward pass for queries seen before
+        """
+        keys = [self._cache_key(query) for query in queries]
+        rows = [self._cache_get(self._embedding_cache, key) for key in keys]
+        misses = [i for i, row in enumerate(rows) if row is None]
+
+        if misses:
+            # normalize_embeddings=True normalizes on-device inside encode,
+            # saving a separate normalize_L2 pass
+            encoded = self.embedding_manager.model.encode(
+                [queries[i] for i in misses], batch_size=len(misses),
+                convert_to_numpy=True, normalize_embeddings=True
+            )
+            # FAISS requires contiguous FP32 input; enforcing it here once
+            # avoids hidden per-call copies (and upcasts FP16 model output)
+            encoded = np.ascontiguousarray(encoded, dtype=np.float32)
+            for i, row in zip(misses, encoded):
+                rows[i] = row
+                self._cache_put(self._embedding_cache, keys[i], row, EMBEDDING_CACHE_SIZE)
+
+        return np.vstack(rows)
+
+    @staticmethod
+    def _cache_key(query: str) -> str:
+        """Hash of the normalized question, so trivial variants share entries"""
+        return hashlib.sha1(query.strip().lower().encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _cache_get(cache: OrderedDict, key):
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _cache_put(cache: OrderedDict, key, value, maxsize: int):
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > maxsize:
+            cache.popitem(last=False)
+
+    def _rerank_fp32(self, query_embeddings: np.ndarray, indices: np.ndarray,
+                     top_k: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """
+        Rerank oversampled candidate rows with exact FP32 inner products
+
+        Args:
+            query_embeddings: Normalized FP32 query matrix
+            indices: Candidate index matrix from the quantized FAISS search
+            top_k: Number of results to keep per query
+
+        Returns:
+            Tuple of (scores, indices), each a list of per-query arrays
+        """
+        corpus = self.embedding_manager.corpus_embeddings
+        reranked_scores = []
+        reranked_indices = []
+
+        for query, row in zip(query_embeddings, indices):
+            valid = row[row >= 0]
+            candidate_scores = corpus[valid] @ query
+            order = np.argsort(-candidate_scores)[:top_k]
+            reranked_indices.append(valid[order])
+            reranked_scores.append(candidate_scores[order])
+
+        return reranked_scores, reranked_indices
     
     def get_context(self, query: str, top_k: int = 3) -> str:
         """
@@ -72,16 +227,27 @@ class SemanticRetriever:
         Returns:
             Concatenated context string
         """
-        results = self.search(query, top_k)
-        
-        if not results:
-            return ""
-        
-        context_parts = []
-        for i, (text, score) in enumerate(results, 1):
-            context_parts.append(f"[Passage {i}] {text}")
-        
-        return "\n\n".join(context_parts)
+        return self.get_context_batch([query], top_k)[0]
+
+    def get_context_batch(self, queries: List[str], top_k: int = 3) -> List[str]:
+        """
+        Get concatenated context for several queries using one batched search
+
+        Args:
+            queries: List of user questions
+            top_k: Number of chunks to include per query
+
+        Returns:
+            List of concatenated context strings, one per query
+        """
+        # Format straight from the index arrays; no intermediate tuple lists
+        return [
+            "\n\n".join(
+                f"[Passage {i}] {self.texts[idx]}"
+                for i, idx in enumerate(row_indices, 1)
+            )
+            for row_indices, _ in self._search_arrays_batch(queries, top_k)
+        ]
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)